@@ -1,136 +1,62 @@
 import argparse
 import os
-import pandas as pd
-import yfinance as yf
-from datetime import timedelta
-
-
-def detect_columns(df):
-    cols = {c.lower(): c for c in df.columns}
-    symbol_col = None
-    date_col = None
-    for name in ['symbol', 'stock', 'ticker']:
-        if name in cols:
-            symbol_col = cols[name]
-            break
-    for name in ['date', 'signal_date']:
-        if name in cols:
-            date_col = cols[name]
-            break
-    if symbol_col is None or date_col is None:
-        raise ValueError('Could not detect symbol and date columns. Expected columns like "symbol" and "date"')
-    return symbol_col, date_col
-
-
-def get_prices(symbol, start, end):
-    # Try multiple ticker variants (common for Indian tickers on Yahoo Finance)
-    # prefer NSE/BSE suffixes for Indian tickers, then try raw symbol
-    candidates = [symbol + '.NS', symbol + '.BO', symbol]
-    for t in candidates:
-        try:
-            df = yf.download(t, start=start.strftime('%Y-%m-%d'), end=(end + timedelta(days=1)).strftime('%Y-%m-%d'), progress=False)
-        except Exception:
-            df = None
-        if df is None or df.empty:
-            continue
-        df = df.sort_index()
-        return df[['Close']]
-    return None
-
-
-def find_entry_exit(hist, signal_dt, days):
-    # hist is df with DatetimeIndex
-    hist_idx = hist.index
-    # find first trading day on/after signal
-    candidate = hist_idx[hist_idx >= signal_dt]
-    if candidate.empty:
-        return None, None, None, None
-    entry_date = candidate[0]
-    entry_pos = hist_idx.get_loc(entry_date)
-    exit_pos = entry_pos + days
-    if exit_pos >= len(hist_idx):
-        v = hist.loc[entry_date, 'Close']
-        if isinstance(v, pd.Series):
-            v = v.iloc[0]
-        return entry_date, v, None, None
-    exit_date = hist_idx[exit_pos]
-    v1 = hist.loc[entry_date, 'Close']
-    v2 = hist.loc[exit_date, 'Close']
-    if isinstance(v1, pd.Series):
-        v1 = v1.iloc[0]
-    if isinstance(v2, pd.Series):
-        v2 = v2.iloc[0]
-    return entry_date, v1, exit_date, v2
+
+from backtest_core import compute_returns_vectorized, load_prices, read_signals, signal_window
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from pyarrow import csv as pacsv
+except ImportError:  # optional; results are written with pandas instead
+    pa = None
 
 
 def run_backtest(signals_path, investment, days, output_path):
-    sigs = pd.read_csv(signals_path)
-    symbol_col, date_col = detect_columns(sigs)
-    # many exported scanners use DD-MM-YYYY — parse with dayfirst=True
-    sigs[date_col] = pd.to_datetime(sigs[date_col], dayfirst=True)
-
-    results = []
-    cache = {}
-
-    for _, row in sigs.iterrows():
-        symbol = str(row[symbol_col]).strip()
-        sig_dt = row[date_col].to_pydatetime()
-        print(f"Processing {symbol} on {sig_dt.date()}")
-        if symbol not in cache:
-            # download a reasonable range around the earliest and latest dates
-            cache[symbol] = None
-        # ensure we have prices covering this signal → download if missing or too small
-        # download window: signal date -> signal date + days + 10 to be safe
-        start = sig_dt - timedelta(days=1)
-        end = sig_dt + timedelta(days=days + 3)
-        hist = get_prices(symbol, start, end)
-        if hist is None:
-            results.append({
-                'symbol': symbol,
-                'signal_date': sig_dt.date(),
-                'entry_date': None,
-                'entry_price': None,
-                'exit_date': None,
-                'exit_price': None,
-                'return_pct': None,
-                'profit': None,
-                'investment': investment,
-                'note': 'no price data'
-            })
-            continue
-
-        entry_date, entry_price, exit_date, exit_price = find_entry_exit(hist, sig_dt, days)
-        if entry_price is None:
-            note = 'no entry'
-            ret = None
-            profit = None
-        elif exit_price is None:
-            note = 'no exit (insufficient data)'
-            ret = None
-            profit = None
-        else:
-            ret = (exit_price - entry_price) / entry_price
-            profit = ret * investment
-            note = ''
-
-        results.append({
-            'symbol': symbol,
-            'signal_date': sig_dt.date(),
-            'entry_date': getattr(entry_date, 'date', lambda: None)() if entry_date is not None else None,
-            'entry_price': float(entry_price) if entry_price is not None else None,
-            'exit_date': getattr(exit_date, 'date', lambda: None)() if exit_date is not None else None,
-            'exit_price': float(exit_price) if exit_price is not None else None,
-            'return_pct': float(ret) if ret is not None else None,
-            'profit': float(profit) if profit is not None else None,
-            'investment': investment,
-            'note': note
-        })
-
-    out_df = pd.DataFrame(results)
-    out_df.to_csv(output_path, index=False)
+    sigs = read_signals(signals_path)
+
+    # download every symbol once over a window covering all of its signals
+    start, end = signal_window(sigs, days)
+    cache = load_prices(list(sigs['symbol'].cat.categories), start, end)
+
+    def report(symbol, done, total):
+        print(f"Processed {symbol} ({done}/{total} signals)")
+
+    out_df = compute_returns_vectorized(cache, sigs, days, investment, progress=report)
+    write_csv(out_df, output_path)
     print(f"Saved results to {output_path}")
 
 
+def write_csv(df, path):
+    # pyarrow's writer is native and multi-threaded, which matters for large
+    # result sets, and streams straight to the file. Dates are written as
+    # plain YYYY-MM-DD and whole-number floats as e.g. 1000.0, like pandas.
+    # Arrow can't write a value that needs quoting without quoting every
+    # string, so such (rare) frames go through pandas.
+    if pa is not None:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            for i, field in enumerate(table.schema):
+                if pa.types.is_timestamp(field.type):
+                    table = table.set_column(i, field.name, table.column(i).cast(pa.date32()))
+                elif pa.types.is_floating(field.type):
+                    table = table.set_column(i, field.name, _float_strings(table.column(i)))
+            with pa.OSFile(str(path), 'wb') as f:
+                f.write((','.join(df.columns) + '\n').encode('utf-8'))
+                pacsv.write_csv(table, f, write_options=pacsv.WriteOptions(include_header=False, quoting_style='none'))
+        except pa.ArrowException:
+            pass
+        else:
+            return
+    df.to_csv(path, index=False)
+
+
+def _float_strings(col):
+    # Arrow prints 1000.0 as "1000", which reads back as an integer column
+    text = pc.cast(col, pa.string())
+    whole = pc.match_substring_regex(text, r'^-?[0-9]+$')
+    return pc.if_else(whole, pc.binary_join_element_wise(text, '.0', ''), text)
+
+
 def main():
     parser = argparse.ArgumentParser(description='Simple 1-leg backtest: entry on signal date, exit after N trading days')
     parser.add_argument('--signals', required=True, help='CSV file with signal rows (columns: symbol and date)')
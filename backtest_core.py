@@ -0,0 +1,379 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+import price_cache
+
+try:
+    import numba as nb
+except ImportError:  # optional; the numpy path below is used instead
+    nb = None
+
+try:
+    import pandas_market_calendars as mcal
+except ImportError:  # optional; plain Mon-Fri business days are used instead
+    mcal = None
+
+try:
+    import numexpr as ne
+except ImportError:  # optional; plain numpy arithmetic is used instead
+    ne = None
+
+# Shared by backtest.py (CLI) and streamlit_app.py: reading signals, fetching
+# prices, computing trades and formatting results. The entry points only add
+# their own I/O, caching layer and progress reporting on top.
+
+# Yahoo's multi-ticker download starts to drop tickers beyond ~20 per request
+BATCH_SIZE = 20
+# parallel single-symbol fetches; these are network bound, not GIL bound
+MAX_WORKERS = 8
+# below this many elements numexpr's setup costs more than the extra
+# temporaries it saves
+NUMEXPR_MIN_SIZE = 100_000
+
+
+def detect_columns(df):
+    cols = {c.lower(): c for c in df.columns}
+    symbol_col = None
+    date_col = None
+    for name in ['symbol', 'stock', 'ticker']:
+        if name in cols:
+            symbol_col = cols[name]
+            break
+    for name in ['date', 'signal_date']:
+        if name in cols:
+            date_col = cols[name]
+            break
+    if symbol_col is None or date_col is None:
+        raise ValueError('Could not detect symbol and date columns. Expected columns like "symbol" and "date"')
+    return symbol_col, date_col
+
+
+def read_signals(src):
+    # src is a path or an open file (e.g. a Streamlit upload). Returns a frame
+    # with a categorical 'symbol' and a datetime 'date' column.
+    # read just the header to find the columns, then parse only those two
+    symbol_col, date_col = detect_columns(pd.read_csv(src, nrows=0))
+    if hasattr(src, 'seek'):
+        src.seek(0)
+    # many exported scanners use DD-MM-YYYY — parse with dayfirst=True
+    sigs = pd.read_csv(src, usecols=[symbol_col, date_col], dtype={symbol_col: 'string'},
+                       parse_dates=[date_col], dayfirst=True, engine='c')
+    if not pd.api.types.is_datetime64_any_dtype(sigs[date_col]):
+        # read_csv leaves the column as text when it can't infer one format
+        sigs[date_col] = pd.to_datetime(sigs[date_col], dayfirst=True)
+    sigs = sigs.rename(columns={symbol_col: 'symbol', date_col: 'date'})
+    sigs['symbol'] = sigs['symbol'].str.strip().astype('category')
+    return sigs
+
+
+def ticker_candidates(symbol):
+    # Try multiple ticker variants (common for Indian tickers on Yahoo Finance)
+    # prefer NSE/BSE suffixes for Indian tickers, then try raw symbol
+    return [symbol + '.NS', symbol + '.BO', symbol]
+
+
+def exchange_holidays():
+    # NSE holidays when pandas_market_calendars is around, else none
+    if mcal is None:
+        return []
+    try:
+        return list(mcal.get_calendar('XNSE').holidays().holidays)
+    except Exception:
+        return []
+
+
+def exit_window_end(signal_dt, days, holidays=()):
+    # last date that can hold the exit bar: `days` trading days after the
+    # entry, plus one spare business day for a holiday the calendar missed
+    if pd.isna(signal_dt):
+        return pd.NaT
+    day = signal_dt.to_datetime64().astype('datetime64[D]')
+    return pd.Timestamp(np.busday_offset(day, days + 1, roll='forward', holidays=holidays))
+
+
+def signal_window(sigs, days):
+    # one download window covering every signal's entry and exit
+    start = sigs['date'].min() - timedelta(days=1)
+    end = exit_window_end(sigs['date'].max(), days, exchange_holidays())
+    return start, end
+
+
+def close_columns(df, tickers):
+    # keep only Close, as a (dates x tickers) frame, as soon as a response
+    # arrives; batched downloads have (ticker, field) column pairs, a lone
+    # ticker comes back flat
+    if isinstance(df.columns, pd.MultiIndex):
+        return df.xs('Close', axis=1, level=1)
+    return df[['Close']].set_axis(list(tickers)[:1], axis=1)
+
+
+def extract_close(closes, ticker):
+    if ticker not in closes.columns:
+        return None
+    # the batch index is the union of all tickers' dates
+    close = closes[ticker].dropna()
+    if close.empty:
+        return None
+    if close.index.tz is not None:
+        # Ticker.history keeps the exchange timezone; signal dates are naive
+        close.index = close.index.tz_localize(None)
+    return close.sort_index().to_frame('Close')
+
+
+def download_chunk(tickers, start, end):
+    # one yf.download for up to BATCH_SIZE tickers over the cache window;
+    # returns {ticker: Close frame} and records the prices in price_cache
+    fetch_start, fetch_end = price_cache.download_window(start, end)
+    try:
+        df = yf.download(list(tickers), start=fetch_start.strftime('%Y-%m-%d'), end=(fetch_end + timedelta(days=1)).strftime('%Y-%m-%d'), progress=False, group_by='ticker', threads=True, auto_adjust=True, actions=False)
+    except Exception:
+        df = None
+    if df is None or df.empty:
+        # yfinance reports failures as an empty frame, so don't cache misses
+        return {}
+    df = close_columns(df, tickers)
+    closes = {}
+    for t in tickers:
+        close = extract_close(df, t)
+        # a ticker absent or all-NaN here may just have been dropped by the
+        # batch endpoint, so only download_ticker records misses
+        if close is not None:
+            price_cache.save(t, close, fetch_start, fetch_end)
+            closes[t] = close
+    return closes
+
+
+def download_ticker(ticker, start, end):
+    # single-ticker fetch; Ticker.history, unlike yf.download, is safe to
+    # call from several threads. Returns the Close frame or None.
+    fetch_start, fetch_end = price_cache.download_window(start, end)
+    try:
+        df = yf.Ticker(ticker).history(start=fetch_start.strftime('%Y-%m-%d'), end=(fetch_end + timedelta(days=1)).strftime('%Y-%m-%d'), auto_adjust=True, actions=False)
+    except Exception:
+        return None
+    close = None
+    if df is not None and not df.empty:
+        close = extract_close(close_columns(df, [ticker]), ticker)
+    # an empty answer to a single-ticker request is a real miss; price_cache
+    # keeps it for TTL so the other candidates aren't refetched every run
+    price_cache.save(ticker, close, fetch_start, fetch_end)
+    return close
+
+
+def get_prices(symbol, start, end, fetch_ticker=download_ticker):
+    for t in ticker_candidates(symbol):
+        close = price_cache.load(t, start, end)
+        if close is None:
+            close = fetch_ticker(t, start, end)
+        if close is not None and not close.empty:
+            return close
+    return None
+
+
+def get_prices_batch(symbols, start, end, fetch_chunk=download_chunk, fetch_ticker=download_ticker):
+    # one request per BATCH_SIZE tickers instead of one per signal row, and
+    # none at all for tickers already in the on-disk cache;
+    # returns {symbol: Close frame} for the symbols found in the response
+    candidates = {symbol: ticker_candidates(symbol) for symbol in symbols}
+    closes, tickers = price_cache.split_cached(candidates, start, end)
+    for i in range(0, len(tickers), BATCH_SIZE):
+        closes.update(fetch_chunk(tuple(tickers[i:i + BATCH_SIZE]), start, end))
+    # a preferred ticker missing from the response may just have been dropped
+    # by the batch endpoint; confirm it on its own before settling for a later
+    # candidate (download_ticker records the real misses)
+    requested = set(tickers)
+    confirm = []
+    for ts in candidates.values():
+        first = next((i for i, t in enumerate(ts) if t in closes), None)
+        if first is not None:
+            confirm.extend(t for t in ts[:first] if t in requested)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        for t, close in zip(confirm, ex.map(lambda t: fetch_ticker(t, start, end), confirm)):
+            if close is not None and not close.empty:
+                closes[t] = close
+    prices = {}
+    for symbol, ts in candidates.items():
+        used = next((t for t in ts if t in closes), None)
+        if used is not None:
+            prices[symbol] = closes[used]
+    return prices
+
+
+def get_prices_many(symbols, start, end, fetch_ticker=download_ticker):
+    # get_prices for each symbol, MAX_WORKERS at a time
+    prices = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futs = {ex.submit(get_prices, symbol, start, end, fetch_ticker): symbol for symbol in symbols}
+        for f in as_completed(futs):
+            prices[futs[f]] = f.result()
+    return prices
+
+
+def load_prices(symbols, start, end, fetch_chunk=download_chunk, fetch_ticker=download_ticker):
+    # {symbol: Close frame or None}. fetch_chunk / fetch_ticker default to
+    # download_chunk / download_ticker and can be swapped for cached
+    # wrappers with the same signature (see streamlit_app.py).
+    prices = get_prices_batch(symbols, start, end, fetch_chunk, fetch_ticker)
+    # the batch endpoint drops tickers now and then; retry those on their own
+    prices.update(get_prices_many([s for s in symbols if s not in prices], start, end, fetch_ticker))
+    return prices
+
+
+def _returns(exit_px, entry_px):
+    # (exit - entry) / entry; one fused, threaded pass with numexpr on big arrays
+    if ne is not None and len(entry_px) >= NUMEXPR_MIN_SIZE:
+        return ne.evaluate('(ex - en) / en', local_dict={'ex': exit_px, 'en': entry_px})
+    return (exit_px - entry_px) / entry_px
+
+
+def _profits(rets, investment):
+    if ne is not None and len(rets) >= NUMEXPR_MIN_SIZE:
+        return ne.evaluate('ret * inv', local_dict={'ret': rets, 'inv': np.float64(investment)})
+    return rets * investment
+
+
+def _compute_returns_numpy(hist_ts, closes, sig_ts, days):
+    # for every signal of one symbol: position of the first bar on/after it,
+    # position of the bar `days` later, and the return between the two
+    # (NaN when history runs out). Positions may be >= len(hist_ts).
+    entry_pos = np.searchsorted(hist_ts, sig_ts, side='left')
+    exit_pos = entry_pos + days
+    has_exit = exit_pos < len(hist_ts)
+    rets = np.full(len(sig_ts), np.nan)
+    rets[has_exit] = _returns(closes[exit_pos[has_exit]], closes[entry_pos[has_exit]])
+    return entry_pos, exit_pos, rets
+
+
+if nb is not None:
+    # same kernel as a single compiled loop: binary search, gather and return
+    # per signal without temporaries. NaN stays meaningful, so fastmath skips
+    # the nnan/ninf assumptions, and error_model='numpy' turns a zero entry
+    # close into inf as in the numpy path instead of raising.
+    @nb.njit(cache=True, error_model='numpy', fastmath={'nsz', 'arcp', 'contract', 'afn', 'reassoc'})
+    def _compute_returns(hist_ts, closes, sig_ts, days):
+        n = hist_ts.shape[0]
+        m = sig_ts.shape[0]
+        entry_pos = np.empty(m, np.int64)
+        exit_pos = np.empty(m, np.int64)
+        rets = np.empty(m, np.float64)
+        for i in range(m):
+            lo = 0
+            hi = n
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if hist_ts[mid] < sig_ts[i]:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            entry_pos[i] = lo
+            exit_pos[i] = lo + days
+            if lo + days < n:
+                rets[i] = (closes[lo + days] - closes[lo]) / closes[lo]
+            else:
+                rets[i] = np.nan
+        return entry_pos, exit_pos, rets
+else:
+    _compute_returns = _compute_returns_numpy
+
+
+def compute_returns_vectorized(cache, signals_df, days, investment, progress=None):
+    # cache is {symbol: Close frame or None}, signals_df comes from
+    # read_signals. Returns one result row per signal, in input order.
+    # progress(symbol, rows_done, rows_total) is called after each symbol.
+    sigs = signals_df.reset_index(drop=True)
+    n = len(sigs)
+    # one slot per signal row, filled symbol by symbol
+    entry_dates = np.full(n, np.datetime64('NaT'), dtype='datetime64[ns]')
+    exit_dates = np.full(n, np.datetime64('NaT'), dtype='datetime64[ns]')
+    entry_prices = np.full(n, np.nan)
+    exit_prices = np.full(n, np.nan)
+    rets = np.full(n, np.nan)
+    notes = np.full(n, 'no price data', dtype=object)
+    # signal dates as int64 ns, converted once rather than per symbol
+    sig_dt = sigs['date'].values.astype('datetime64[ns]')
+    sig_ts_all = sig_dt.view('i8')
+    # NaT views as INT64_MIN, which would match the first bar of any history
+    sig_nat = np.isnat(sig_dt)
+
+    done = 0
+    for symbol, group in sigs.groupby('symbol', sort=False, observed=True):
+        hist = cache.get(symbol)
+        if hist is not None:
+            rows = group.index.to_numpy()
+            hist_idx = hist.index.values.astype('datetime64[ns]')
+            closes = hist['Close'].to_numpy(dtype=np.float64)
+            entry_pos, exit_pos, group_rets = _compute_returns(hist_idx.view('i8'), closes, sig_ts_all[rows], days)
+            # a blank signal date has no entry
+            nat = sig_nat[rows]
+            entry_pos[nat] = len(hist)
+            exit_pos[nat] = len(hist) + days
+            group_rets[nat] = np.nan
+            rets[rows] = group_rets
+            has_entry = entry_pos < len(hist)
+            has_exit = exit_pos < len(hist)
+            entry_dates[rows[has_entry]] = hist_idx[entry_pos[has_entry]]
+            entry_prices[rows[has_entry]] = closes[entry_pos[has_entry]]
+            exit_dates[rows[has_exit]] = hist_idx[exit_pos[has_exit]]
+            exit_prices[rows[has_exit]] = closes[exit_pos[has_exit]]
+            notes[rows] = np.where(has_exit, '', np.where(has_entry, 'no exit (insufficient data)', 'no entry'))
+        done += len(group)
+        if progress:
+            progress(symbol, done, n)
+
+    profits = _profits(rets, investment)
+
+    return pd.DataFrame({
+        'symbol': sigs['symbol'].astype('string'),
+        'signal_date': sigs['date'].dt.normalize(),
+        'entry_date': entry_dates,
+        'entry_price': pd.array(entry_prices, dtype='Float64'),
+        'exit_date': exit_dates,
+        'exit_price': pd.array(exit_prices, dtype='Float64'),
+        'return_pct': pd.array(rets, dtype='Float64'),
+        'profit': pd.array(profits, dtype='Float64'),
+        'investment': float(investment),
+        'note': pd.array(notes, dtype='string'),
+    })
+
+
+def format_dates(values):
+    # YYYY-MM-DD for a datetime column in one numpy call instead of a
+    # strftime per Timestamp; NaT becomes blank
+    days = values.values.astype('datetime64[D]')
+    out = np.datetime_as_string(days, unit='D').astype(object)
+    out[np.isnat(days)] = ''
+    return pd.Series(out, index=values.index, name=values.name)
+
+
+def format_number(values, fmt):
+    # format every numeric cell with fmt in one map call; blanks stay blank and
+    # anything that isn't a number (e.g. an already formatted '1.23%') is kept
+    num = pd.to_numeric(values, errors='coerce')
+    kept = values.astype(object).where(values.notna(), '')
+    return num.map(fmt.format, na_action='ignore').where(num.notna(), kept)
+
+
+def format_pct(values):
+    # if abs less than 2, assume it's a fraction (e.g., 0.01 -> 1.00%) else if >2 treat as already percentage
+    num = pd.to_numeric(values, errors='coerce')
+    pct = num.mask(num.abs() < 2, num * 100)
+    kept = values.astype(object).where(values.notna(), '')
+    return pct.map('{:.2f}%'.format, na_action='ignore').where(num.notna(), kept)
+
+
+def format_results_inplace(df):
+    # turn a results frame (fresh from compute_returns_vectorized or read back
+    # from CSV) into display strings; returns df for chaining
+    for col in ['signal_date', 'entry_date', 'exit_date']:
+        if col in df.columns and pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = format_dates(df[col])
+    for col in ['entry_price', 'exit_price', 'profit', 'investment']:
+        if col in df.columns:
+            df[col] = format_number(df[col], '{:.2f}')
+    if 'return_pct' in df.columns:
+        df['return_pct'] = format_pct(df['return_pct'])
+    return df
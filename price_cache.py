@@ -0,0 +1,98 @@
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+# Close series live in CACHE_DIR/<TICKER>.pkl with a <TICKER>.json sidecar
+# recording the window the data covers and when it was downloaded.
+CACHE_DIR = '.price_cache'
+# how long the most recent bars are trusted before asking Yahoo again
+TTL = timedelta(days=1)
+# fetch a little history before the earliest signal so nearby runs hit the cache
+LOOKBACK = timedelta(days=30)
+
+
+def _paths(ticker):
+    name = ticker.replace(os.sep, '_')
+    base = os.path.join(CACHE_DIR, name)
+    return base + '.pkl', base + '.json'
+
+
+def download_window(start, end):
+    # widen [start, end] to what should be downloaded and cached: a month of
+    # lookback and everything up to today
+    today = pd.Timestamp.today().normalize()
+    return start - LOOKBACK, max(end, today)
+
+
+def load(ticker, start, end):
+    # Return the cached Close frame covering [start, end], an empty frame if
+    # Yahoo had nothing for the ticker, or None when the cache can't answer.
+    data_path, meta_path = _paths(ticker)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        df = pd.read_pickle(data_path)
+    except Exception:
+        # missing, half-written or unreadable here (e.g. pickled with a
+        # pyarrow that's no longer installed): ask Yahoo again
+        return None
+    if pd.Timestamp(meta['start']) > start:
+        return None
+    if df.empty or pd.Timestamp(meta['end']) < end:
+        # bars after the cached window may exist by now, and a miss may have
+        # been a passing Yahoo failure; trust either only for TTL
+        if datetime.now() - datetime.fromisoformat(meta['last_updated']) > TTL:
+            return None
+    return df
+
+
+def save(ticker, df, start, end):
+    # df may be None to remember that the ticker returned no data
+    if df is None:
+        df = pd.DataFrame(columns=['Close'])
+    # pandas' default str column index pickles as pyarrow-backed when pyarrow
+    # is installed; plain object labels load without it
+    df = df.set_axis(pd.Index(df.columns, dtype=object), axis=1)
+    # the download window runs up to today at least, but bars past today
+    # don't exist yet, so never record coverage beyond it
+    end = min(pd.Timestamp(end), pd.Timestamp.today().normalize())
+    data_path, meta_path = _paths(ticker)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # write to temp files and rename them into place, so a killed run or
+        # two sessions saving the same ticker never leave a partial entry
+        fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            df.to_pickle(f)
+        os.replace(tmp, data_path)
+        fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({
+                'start': pd.Timestamp(start).strftime('%Y-%m-%d'),
+                'end': end.strftime('%Y-%m-%d'),
+                'last_updated': datetime.now().isoformat(timespec='seconds'),
+            }, f)
+        os.replace(tmp, meta_path)
+    except OSError:
+        # caching is best effort; a read-only checkout still works
+        pass
+
+
+def split_cached(candidates, start, end):
+    # candidates is {symbol: [ticker, ...]} in order of preference. Returns the
+    # Close frames found on disk and the tickers that still need downloading:
+    # for each symbol, every uncached ticker ahead of its first cached hit.
+    closes = {}
+    missing = []
+    for tickers in candidates.values():
+        for t in tickers:
+            df = load(t, start, end)
+            if df is None:
+                missing.append(t)
+            elif not df.empty:
+                closes[t] = df
+                break
+    return closes, missing
@@ -1,125 +1,54 @@
 import io
-from datetime import timedelta
 
 import pandas as pd
 import streamlit as st
-import yfinance as yf
-
-
-@st.cache_data
-def get_prices_cached(ticker, start, end):
-    try:
-        df = yf.download(ticker, start=start.strftime('%Y-%m-%d'), end=(end + timedelta(days=1)).strftime('%Y-%m-%d'), progress=False)
-    except Exception:
-        return None
-    if df is None or df.empty:
-        return None
-    return df.sort_index()[['Close']]
-
-
-def get_prices_for_symbol(symbol, start, end):
-    # Try NSE/BSE variants first for Indian tickers
-    candidates = [f"{symbol}.NS", f"{symbol}.BO", symbol]
-    for t in candidates:
-        df = get_prices_cached(t, start, end)
-        if df is not None:
-            return df, t
-    return None, None
-
-
-def detect_columns(df):
-    cols = {c.lower(): c for c in df.columns}
-    symbol_col = None
-    date_col = None
-    for name in ['symbol', 'stock', 'ticker']:
-        if name in cols:
-            symbol_col = cols[name]
-            break
-    for name in ['date', 'signal_date']:
-        if name in cols:
-            date_col = cols[name]
-            break
-    return symbol_col, date_col
-
-
-def find_entry_exit(hist, signal_dt, days):
-    hist_idx = hist.index
-    candidate = hist_idx[hist_idx >= signal_dt]
-    if candidate.empty:
-        return None, None, None, None
-    entry_date = candidate[0]
-    entry_pos = hist_idx.get_loc(entry_date)
-    exit_pos = entry_pos + days
-    if exit_pos >= len(hist_idx):
-        v = hist.loc[entry_date, 'Close']
-        if isinstance(v, pd.Series):
-            v = v.iloc[0]
-        return entry_date, v, None, None
-    exit_date = hist_idx[exit_pos]
-    v1 = hist.loc[entry_date, 'Close']
-    v2 = hist.loc[exit_date, 'Close']
-    if isinstance(v1, pd.Series):
-        v1 = v1.iloc[0]
-    if isinstance(v2, pd.Series):
-        v2 = v2.iloc[0]
-    return entry_date, v1, exit_date, v2
-
-
-def format_results(df):
-    if 'entry_price' in df:
-        df['entry_price'] = df['entry_price'].apply(lambda v: ("{:.2f}".format(v)) if pd.notnull(v) else '')
-    if 'exit_price' in df:
-        df['exit_price'] = df['exit_price'].apply(lambda v: ("{:.2f}".format(v)) if pd.notnull(v) else '')
-    if 'profit' in df:
-        df['profit'] = df['profit'].apply(lambda v: ("{:.2f}".format(v)) if pd.notnull(v) else '')
-    if 'investment' in df:
-        df['investment'] = df['investment'].apply(lambda v: ("{:.2f}".format(v)) if pd.notnull(v) else '')
-    if 'return_pct' in df:
-        def fmt_pct(v):
-            if pd.isnull(v):
-                return ''
-            fv = float(v)
-            if abs(fv) < 2:
-                pct = fv * 100
-            else:
-                pct = fv
-            return "{:.2f}%".format(pct)
-        df['return_pct'] = df['return_pct'].apply(fmt_pct)
-    return df
+
+import backtest_core
+import price_cache
+
+
+# Price lookups are cached at two levels: st.cache_data in memory, shared by
+# every browser session of this server process, on top of price_cache on
+# disk, which survives restarts. The in-memory entries expire after
+# price_cache.TTL; on disk, history already downloaded is kept and only
+# misses and windows reaching past the download day are refetched after TTL.
+@st.cache_data(ttl=price_cache.TTL)
+def get_prices_cached(tickers, start, end):
+    # tickers is a tuple so the whole chunk is one cache key
+    return backtest_core.download_chunk(tickers, start, end)
+
+
+# called from backtest_core's worker threads, which have no script context
+# to draw a spinner in; load_prices below already shows one
+@st.cache_data(ttl=price_cache.TTL, show_spinner=False)
+def get_ticker_prices_cached(ticker, start, end):
+    return backtest_core.download_ticker(ticker, start, end)
+
+
+@st.cache_data(ttl=price_cache.TTL)
+def load_prices(symbols, start, end):
+    return backtest_core.load_prices(symbols, start, end, fetch_chunk=get_prices_cached, fetch_ticker=get_ticker_prices_cached)
 
 
 def run_backtest_df(signals_df, investment, days, show_progress=False):
-    symbol_col, date_col = detect_columns(signals_df)
-    if symbol_col is None or date_col is None:
-        raise st.error('Could not detect symbol/date columns in uploaded CSV. Ensure columns named `symbol` and `date` exist.')
-    signals_df[date_col] = pd.to_datetime(signals_df[date_col], dayfirst=True)
-
-    results = []
-    total = len(signals_df)
-    progress = st.progress(0) if show_progress else None
-    for i, row in signals_df.iterrows():
-        symbol = str(row[symbol_col]).strip()
-        sig_dt = row[date_col].to_pydatetime()
-        start = sig_dt - timedelta(days=1)
-        end = sig_dt + timedelta(days=days + 3)
-        hist, used = get_prices_for_symbol(symbol, start, end)
-        if hist is None:
-            results.append({'symbol': symbol, 'signal_date': sig_dt.date(), 'entry_date': None, 'entry_price': None, 'exit_date': None, 'exit_price': None, 'return_pct': None, 'profit': None, 'investment': investment, 'note': 'no price data'})
-        else:
-            entry_date, entry_price, exit_date, exit_price = find_entry_exit(hist, sig_dt, days)
-            if entry_price is None:
-                results.append({'symbol': symbol, 'signal_date': sig_dt.date(), 'entry_date': None, 'entry_price': None, 'exit_date': None, 'exit_price': None, 'return_pct': None, 'profit': None, 'investment': investment, 'note': 'no entry'})
-            elif exit_price is None:
-                results.append({'symbol': symbol, 'signal_date': sig_dt.date(), 'entry_date': entry_date.date(), 'entry_price': float(entry_price), 'exit_date': None, 'exit_price': None, 'return_pct': None, 'profit': None, 'investment': investment, 'note': 'no exit (insufficient data)'})
-            else:
-                ret = (float(exit_price) - float(entry_price)) / float(entry_price)
-                profit = ret * investment
-                results.append({'symbol': symbol, 'signal_date': sig_dt.date(), 'entry_date': entry_date.date(), 'entry_price': float(entry_price), 'exit_date': exit_date.date(), 'exit_price': float(exit_price), 'return_pct': float(ret), 'profit': float(profit), 'investment': investment, 'note': ''})
-        if progress:
-            progress.progress(int((i + 1) / total * 100))
-
-    out_df = pd.DataFrame(results)
-    return out_df
+    # signals_df comes from backtest_core.read_signals
+    start, end = backtest_core.signal_window(signals_df, days)
+    cache = load_prices(list(signals_df['symbol'].cat.categories), start, end)
+
+    report = None
+    if show_progress:
+        bar = st.progress(0)
+        shown = 0
+
+        def report(symbol, done, total):
+            # each update is a message to the browser; only send real changes
+            nonlocal shown
+            pct = int(done / total * 100)
+            if pct != shown:
+                bar.progress(pct)
+                shown = pct
+
+    return backtest_core.compute_returns_vectorized(cache, signals_df, days, investment, progress=report)
 
 
 def main():
@@ -132,14 +61,14 @@ def main():
 
     if uploaded is not None:
         try:
-            sigs = pd.read_csv(uploaded)
+            sigs = backtest_core.read_signals(uploaded)
         except Exception as e:
             st.error(f'Could not read uploaded CSV: {e}')
             return
         if st.button('Run Backtest'):
             with st.spinner('Running backtest — this may take some time...'):
                 out = run_backtest_df(sigs, investment, int(days), show_progress=True)
-                out_fmt = format_results(out.copy())
+                out_fmt = backtest_core.format_results_inplace(out.copy())
                 st.success('Backtest complete')
                 st.dataframe(out_fmt)
 